@@ -1,5 +1,10 @@
+import csv
+import hashlib
 import json
 import logging
+import re
+import shutil
+import time
 from datetime import datetime
 from pathlib import Path
 
@@ -8,6 +13,7 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 from google.oauth2.service_account import Credentials
+from gspread.utils import absolute_range_name, fill_gaps
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -19,10 +25,16 @@ DATA_DIR = BASE_DIR / "data"
 OUTPUTS_DIR = BASE_DIR / "outputs"
 
 DATABASE_FILE = DATA_DIR / "Database.csv"
+# Benchmark_KmL is read from the Assets worksheet, so the local copy skips it.
+DATABASE_COLUMNS = ["Fleet No", "Asset ID", "Category", "Description", "Plate Number"]
+DATABASE_CATEGORY_COLUMNS = ["Category", "Description"]
 VEHICLE_LOG_FILE = OUTPUTS_DIR / "Fuel_Log_Vehicles.csv"
 TANKER_LOG_FILE = OUTPUTS_DIR / "Fuel_Log_Tankers.csv"
+WORKSHEET_SNAPSHOT_DIR = OUTPUTS_DIR / ".cache"
+# Bump when the parsed frame layout changes so older snapshots are refetched.
+WORKSHEET_SNAPSHOT_FORMAT = 2
 
-ALLOWED_CATEGORIES = ["Vehicle", "Bus", "Equipment", "Machine", "Tanker"]
+ALLOWED_CATEGORIES = frozenset({"Vehicle", "Bus", "Equipment", "Machine", "Tanker"})
 CATEGORY_ALIASES = {
     "vehicle": "Vehicle",
     "vehicles": "Vehicle",
@@ -36,8 +48,10 @@ CATEGORY_ALIASES = {
     "tanker": "Tanker",
     "tankers": "Tanker",
 }
+CATEGORY_SEPARATOR_RE = re.compile(r"&| and ")
 DEFAULT_TANKERS = ["BPS-95", "HSC-116", "BPS-13", "HSC-101"]
-METER_HOUR_CATEGORIES = {"Equipment", "Machine", "Tanker"}
+TANKER_CAPACITY_L = 30000
+METER_HOUR_CATEGORIES = frozenset({"Equipment", "Machine", "Tanker"})
 GOOGLE_SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive",
@@ -65,6 +79,15 @@ DISPENSING_HEADERS = [
 RECEIPT_HEADERS = ["Timestamp", "Date", "Tanker No", "Source Station", "Fuel In (L)"]
 
 DEFAULT_DATE_RANGE_DAYS = 30
+CACHE_TTL_SECONDS = 300
+REVISION_PROBE_TTL_SECONDS = 30
+WORKSHEET_CACHE_TTL_SECONDS = 3600
+LOCAL_TANKER_ENTRIES_KEY = "local_tanker_entries"
+LOCAL_TANKER_ENTRY_COLUMNS = ["Timestamp", "Date", "Tanker", "Fuel In (L)", "Fuel Out (L)"]
+PENDING_ROWS_KEYS = {
+    "Tanker Dispensing": "pending_dispensing_rows",
+    "Tanker Receipts": "pending_receipt_rows",
+}
 DATA_QUALITY_LIMITS = {
     "max_km_delta": 1500,
     "max_hour_delta": 100,
@@ -74,6 +97,21 @@ DATA_QUALITY_LIMITS = {
     "min_efficiency_ratio": 0.75,
     "max_efficiency_ratio": 1.25,
 }
+ISSUE_DISPLAY_COLUMNS = [
+    "Event Datetime",
+    "Fleet No",
+    "Asset ID",
+    "Source Tanker",
+    "Fuel Out (L)",
+    "Current Meter",
+    "Previous Meter",
+    "Meter Delta",
+    "Actual Km/L",
+    "Actual L/hour",
+    "Efficiency Ratio",
+    "Issues",
+]
+ISSUE_DISPLAY_ROW_LIMIT = 500
 
 
 class MissingSecretError(Exception):
@@ -90,8 +128,7 @@ def normalize_category(category: str) -> str:
         return ""
 
     raw_value = str(category).strip()
-    normalized_key = raw_value.replace("&", "/").replace(" and ", "/").lower()
-    normalized_key = normalized_key.replace(" ", "")
+    normalized_key = CATEGORY_SEPARATOR_RE.sub("/", raw_value).lower().replace(" ", "")
 
     canonical = CATEGORY_ALIASES.get(normalized_key)
     if canonical:
@@ -103,6 +140,13 @@ def normalize_category(category: str) -> str:
     return raw_value
 
 
+def normalize_categories(categories: pd.Series) -> pd.Series:
+    """Apply normalize_category once per distinct value and map the results back."""
+
+    lookup = {value: normalize_category(value) for value in categories.dropna().unique()}
+    return categories.map(lookup).fillna("")
+
+
 @st.cache_data
 def load_data(database_path: Path) -> pd.DataFrame:
     if not database_path.exists():
@@ -112,40 +156,78 @@ def load_data(database_path: Path) -> pd.DataFrame:
         )
         return pd.DataFrame()
 
-    dataframe = pd.read_csv(database_path)
+    # The pyarrow engine raises on absent usecols, so check the header first.
+    header = pd.read_csv(database_path, nrows=0).columns
+    missing_columns = [column for column in DATABASE_COLUMNS if column not in header]
+    if missing_columns:
+        st.error(
+            f"⚠️ Critical Error: '{database_path.name}' is missing columns: "
+            f"{', '.join(missing_columns)}."
+        )
+        return pd.DataFrame()
+
+    dataframe = pd.read_csv(database_path, engine="pyarrow", usecols=DATABASE_COLUMNS)
 
     if "Category" in dataframe.columns:
-        dataframe["Category"] = dataframe["Category"].apply(normalize_category)
+        dataframe["Category"] = normalize_categories(dataframe["Category"])
+    # st.cache_data hands every caller its own unpickled copy, so keep it small.
+    for column in DATABASE_CATEGORY_COLUMNS:
+        if column in dataframe.columns:
+            dataframe[column] = dataframe[column].astype("category")
 
     return dataframe
 
 
-def load_logs(file_path: Path, columns) -> pd.DataFrame:
-    if not file_path.exists():
-        return pd.DataFrame(columns=columns)
+@st.cache_resource(show_spinner=False)
+def load_search_options(database_path: Path) -> tuple[str, ...]:
+    """Selectbox options, deduplicated in order; shared as-is since tuples are immutable."""
 
-    return pd.read_csv(file_path)
+    database = load_data(database_path)
+    if database.empty:
+        return ("",)
 
+    return ("",) + tuple(dict.fromkeys(build_search_labels(database)))
 
-def save_log(df: pd.DataFrame, file_path: Path) -> None:
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(file_path, index=False)
 
+@st.cache_resource(show_spinner=False)
+def load_asset_lookup(database_path: Path) -> dict[str, dict]:
+    """Map each search label to its asset row (first match wins).
 
-def build_search_labels(dataframe: pd.DataFrame) -> pd.DataFrame:
-    if dataframe.empty:
-        return dataframe
+    The dict is shared across reruns and sessions, so callers must only read it.
+    """
 
-    return dataframe.assign(
-        Search_Label=lambda frame: (
-            frame["Fleet No"].astype(str)
-            + " | "
-            + frame["Description"].astype(str)
-            + " ("
-            + frame["Plate Number"].astype(str)
-            + ")"
+    database = load_data(database_path)
+    if database.empty:
+        return {}
+
+    row_by_label = {}
+    for label, record in zip(build_search_labels(database), database.to_dict("records")):
+        row_by_label.setdefault(label, record)
+    return row_by_label
+
+
+def append_log(entry: dict, file_path: Path) -> None:
+    """Append one row to a local CSV log, writing the header only for a new file."""
+
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    write_header = not file_path.exists() or file_path.stat().st_size == 0
+    # One row does not need a DataFrame; blank out missing values as to_csv would.
+    with file_path.open("a", newline="", encoding="utf-8") as log_file:
+        writer = csv.writer(log_file, lineterminator="\n")
+        if write_header:
+            writer.writerow(entry)
+        writer.writerow("" if pd.isna(value) else value for value in entry.values())
+
+
+def build_search_labels(dataframe: pd.DataFrame) -> list[str]:
+    """Display labels for the asset selectbox, one per row of ``dataframe``."""
+
+    return [
+        f"{fleet_no} | {description} ({plate_number})"
+        for fleet_no, description, plate_number in zip(
+            dataframe["Fleet No"], dataframe["Description"], dataframe["Plate Number"]
         )
-    )
+    ]
 
 
 def get_tanker_options(dataframe: pd.DataFrame):
@@ -157,6 +239,11 @@ def get_tanker_options(dataframe: pd.DataFrame):
     return DEFAULT_TANKERS
 
 
+@st.cache_data(show_spinner=False)
+def load_tanker_options(database_path: Path) -> tuple[str, ...]:
+    return tuple(get_tanker_options(load_data(database_path)))
+
+
 def _serialize_service_account(service_account_info) -> str:
     """Return a stable JSON string for caching client resources."""
 
@@ -168,17 +255,27 @@ def _serialize_service_account(service_account_info) -> str:
     return json.dumps(service_account_dict, sort_keys=True)
 
 
+def service_account_digest(service_account_json: str) -> str:
+    """Short cache key for client resources, so caches never hash the key material itself."""
+
+    return hashlib.blake2b(service_account_json.encode("utf-8"), digest_size=16).hexdigest()
+
+
 @st.cache_resource
-def get_gspread_client(service_account_json: str) -> gspread.Client:
+def get_gspread_client(credentials_digest: str, _service_account_json: str) -> gspread.Client:
     credentials = Credentials.from_service_account_info(
-        json.loads(service_account_json), scopes=GOOGLE_SCOPES
+        json.loads(_service_account_json), scopes=GOOGLE_SCOPES
     )
+    # gspread's AuthorizedSession already keeps HTTPS connections alive; caching the
+    # client is what lets reruns reuse them.
     return gspread.authorize(credentials)
 
 
 @st.cache_resource
-def open_spreadsheet(sheet_url: str, service_account_json: str) -> gspread.Spreadsheet:
-    client = get_gspread_client(service_account_json)
+def open_spreadsheet(
+    sheet_url: str, credentials_digest: str, _service_account_json: str
+) -> gspread.Spreadsheet:
+    client = get_gspread_client(credentials_digest, _service_account_json)
     return client.open_by_url(sheet_url)
 
 
@@ -206,52 +303,53 @@ def require_google_sheet():
         )
 
     service_account_json = _serialize_service_account(service_account_info)
-    spreadsheet = open_spreadsheet(sheet_url, service_account_json)
+    spreadsheet = open_spreadsheet(
+        sheet_url, service_account_digest(service_account_json), service_account_json
+    )
 
     return spreadsheet, sheet_url, service_account_json, secrets_keys
 
 
 def get_worksheet(spreadsheet: gspread.Spreadsheet, worksheet_name: str) -> gspread.Worksheet:
+    """Return a worksheet handle, resolving it only once per browser session."""
+
+    session_key = f"worksheet_{spreadsheet.id}_{worksheet_name}"
+    worksheet = st.session_state.get(session_key)
+    if worksheet is not None:
+        return worksheet
+
     try:
-        return spreadsheet.worksheet(worksheet_name)
+        worksheet = spreadsheet.worksheet(worksheet_name)
     except Exception as error:
         st.error(f"Unable to access worksheet '{worksheet_name}': {error}")
         st.stop()
 
+    st.session_state[session_key] = worksheet
+    return worksheet
+
 
 HEADERS_BY_WORKSHEET = {
     "Assets": ASSETS_HEADERS,
     "Tanker Dispensing": DISPENSING_HEADERS,
     "Tanker Receipts": RECEIPT_HEADERS,
 }
+WORKSHEET_NAMES = tuple(HEADERS_BY_WORKSHEET)
+NUMERIC_COLUMNS_BY_WORKSHEET = {
+    "Assets": ["Benchmark_KmL"],
+    "Tanker Dispensing": ["Fuel Out (L)", "Current Meter"],
+    "Tanker Receipts": ["Fuel In (L)"],
+}
+EVENT_WORKSHEETS = {"Tanker Dispensing", "Tanker Receipts"}
+CATEGORY_COLUMNS_BY_WORKSHEET = {
+    "Tanker Dispensing": ["Source Tanker", "Meter Unit"],
+    "Tanker Receipts": ["Tanker No", "Source Station"],
+}
+# The asset join needs plain strings, so these are categorized once it is done.
+MERGED_CATEGORY_COLUMNS = ["Category", "Fleet No", "Asset ID", "Asset Key"]
 
 
-@st.cache_data(ttl=120)
-def load_worksheet_dataframe(
-    sheet_url: str,
-    worksheet_name: str,
-    service_account_json: str,
-):
-    try:
-        spreadsheet = open_spreadsheet(sheet_url, service_account_json)
-    except Exception as error:
-        raise RuntimeError(f"Unable to open spreadsheet: {error}")
-
-    worksheet_titles = [ws.title for ws in spreadsheet.worksheets()]
-    if worksheet_name not in worksheet_titles:
-        raise KeyError(
-            f"Worksheet '{worksheet_name}' not found. Available worksheets: {worksheet_titles}"
-        )
-
-    try:
-        worksheet = spreadsheet.worksheet(worksheet_name)
-    except Exception as error:
-        raise RuntimeError(f"Unable to access worksheet '{worksheet_name}': {error}")
-
-    try:
-        values = worksheet.get_all_values()
-    except Exception as error:
-        raise RuntimeError(f"Failed to read worksheet '{worksheet_name}': {error}")
+def build_worksheet_dataframe(worksheet_name: str, values: list) -> pd.DataFrame:
+    """Validate the header row of raw worksheet values and build a DataFrame."""
 
     if not values:
         expected_headers = HEADERS_BY_WORKSHEET.get(worksheet_name, [])
@@ -259,6 +357,7 @@ def load_worksheet_dataframe(
             f"Worksheet '{worksheet_name}' returned no data. Expected headers: {expected_headers}"
         )
 
+    values = fill_gaps(values)
     headers = [header.strip() for header in values[0]]
     required_headers = HEADERS_BY_WORKSHEET.get(worksheet_name, headers)
     missing_headers = [header for header in required_headers if header not in headers]
@@ -274,16 +373,156 @@ def load_worksheet_dataframe(
     if len(values) <= 1:
         raise ValueError(f"Worksheet '{worksheet_name}' is empty beyond the header row.")
 
-    return pd.DataFrame(values[1:], columns=headers)
+    dataframe = pd.DataFrame(values[1:], columns=headers)
+    for column in NUMERIC_COLUMNS_BY_WORKSHEET.get(worksheet_name, []):
+        dataframe[column] = pd.to_numeric(dataframe[column], errors="coerce")
+    for column in CATEGORY_COLUMNS_BY_WORKSHEET.get(worksheet_name, []):
+        dataframe[column] = dataframe[column].astype("category")
+    if worksheet_name in EVENT_WORKSHEETS:
+        dataframe = parse_event_datetime(dataframe)
 
+    return dataframe
 
-def safe_load_worksheet_dataframe(
+
+@st.cache_data(ttl=REVISION_PROBE_TTL_SECONDS, show_spinner=False)
+def fetch_spreadsheet_revision(sheet_url: str, _service_account_json: str) -> str | None:
+    """Drive modifiedTime of the spreadsheet: one small request instead of a full read."""
+
+    try:
+        spreadsheet = open_spreadsheet(
+            sheet_url, service_account_digest(_service_account_json), _service_account_json
+        )
+        return spreadsheet.get_lastUpdateTime()
+    except Exception as error:
+        logger.warning("Unable to read spreadsheet revision: %s", error)
+        return None
+
+
+def current_sheet_revision(sheet_url: str, service_account_json: str) -> str:
+    """Revision token for the worksheet cache.
+
+    Falls back to the current CACHE_TTL_SECONDS window when Drive metadata is
+    unavailable, so staleness stays bounded the way a plain TTL would.
+    """
+
+    revision = fetch_spreadsheet_revision(sheet_url, service_account_json)
+    if revision:
+        return revision
+    return f"ttl-{int(time.time() // CACHE_TTL_SECONDS)}"
+
+
+def worksheet_snapshot_path(sheet_url: str, worksheet_name: str) -> Path:
+    sheet_key = hashlib.sha1(sheet_url.encode("utf-8")).hexdigest()[:12]
+    return WORKSHEET_SNAPSHOT_DIR / sheet_key / f"{worksheet_name}.parquet"
+
+
+def read_worksheet_snapshots(
+    sheet_url: str, worksheet_names: tuple[str, ...], revision: str
+) -> dict[str, pd.DataFrame] | None:
+    """Return on-disk frames taken at ``revision``, or None if any is missing or outdated."""
+
+    frames = {}
+    for worksheet_name in worksheet_names:
+        snapshot_path = worksheet_snapshot_path(sheet_url, worksheet_name)
+        try:
+            snapshot_tag = snapshot_path.with_suffix(".revision").read_text(encoding="utf-8")
+            if snapshot_tag != f"{WORKSHEET_SNAPSHOT_FORMAT}:{revision}":
+                return None
+            frames[worksheet_name] = pd.read_parquet(snapshot_path)
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            logger.warning("Ignoring unreadable snapshot %s: %s", snapshot_path, error)
+            return None
+    return frames
+
+
+def write_worksheet_snapshots(
+    sheet_url: str, frames: dict[str, pd.DataFrame], revision: str
+) -> None:
+    for worksheet_name, frame in frames.items():
+        snapshot_path = worksheet_snapshot_path(sheet_url, worksheet_name)
+        revision_path = snapshot_path.with_suffix(".revision")
+        temporary_path = snapshot_path.with_suffix(".tmp")
+        try:
+            snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            # Drop the old revision first so a half-written snapshot is never trusted.
+            revision_path.unlink(missing_ok=True)
+            frame.to_parquet(temporary_path, compression="zstd")
+            temporary_path.replace(snapshot_path)
+            revision_path.write_text(f"{WORKSHEET_SNAPSHOT_FORMAT}:{revision}", encoding="utf-8")
+        except Exception as error:
+            logger.warning("Unable to write snapshot %s: %s", snapshot_path, error)
+
+
+@st.cache_data(ttl=WORKSHEET_CACHE_TTL_SECONDS, show_spinner=False, max_entries=8)
+def load_worksheet_dataframes(
+    sheet_url: str,
+    _service_account_json: str,
+    worksheet_names: tuple[str, ...] = WORKSHEET_NAMES,
+    revision: str = "",
+) -> dict[str, pd.DataFrame]:
+    """Read every requested worksheet with a single values.batchGet round-trip.
+
+    ``revision`` is part of the cache key, so frames are reused until the
+    spreadsheet changes. They are also snapshotted to Parquet so a restarted
+    app can skip the fetch while the sheet is still at the same revision.
+    """
+
+    snapshots = read_worksheet_snapshots(sheet_url, worksheet_names, revision)
+    if snapshots is not None:
+        return snapshots
+
+    try:
+        spreadsheet = open_spreadsheet(
+            sheet_url, service_account_digest(_service_account_json), _service_account_json
+        )
+    except Exception as error:
+        raise RuntimeError(f"Unable to open spreadsheet: {error}")
+
+    try:
+        response = spreadsheet.values_batch_get(
+            [absolute_range_name(worksheet_name) for worksheet_name in worksheet_names]
+        )
+    except Exception as error:
+        # Only pay for the metadata request when the batch read fails, to tell a
+        # missing tab apart from any other API error.
+        try:
+            worksheet_titles = [ws.title for ws in spreadsheet.worksheets()]
+        except Exception:
+            worksheet_titles = None
+
+        if worksheet_titles is not None:
+            for worksheet_name in worksheet_names:
+                if worksheet_name not in worksheet_titles:
+                    raise KeyError(
+                        f"Worksheet '{worksheet_name}' not found. "
+                        f"Available worksheets: {worksheet_titles}"
+                    )
+
+        raise RuntimeError(f"Failed to read worksheets {list(worksheet_names)}: {error}")
+
+    value_ranges = response.get("valueRanges", [])
+    frames = {
+        worksheet_name: build_worksheet_dataframe(worksheet_name, value_range.get("values", []))
+        for worksheet_name, value_range in zip(worksheet_names, value_ranges)
+    }
+    write_worksheet_snapshots(sheet_url, frames, revision)
+    return frames
+
+
+def safe_load_worksheet_dataframes(
     sheet_url: str,
-    worksheet_name: str,
     service_account_json: str,
-):
+    worksheet_names: tuple[str, ...] = WORKSHEET_NAMES,
+    revision: str = "",
+) -> dict[str, pd.DataFrame]:
+    # Callers that key derived caches on the revision pass the token they used.
+    revision = revision or current_sheet_revision(sheet_url, service_account_json)
     try:
-        return load_worksheet_dataframe(sheet_url, worksheet_name, service_account_json)
+        return load_worksheet_dataframes(
+            sheet_url, service_account_json, worksheet_names, revision
+        )
     except KeyError as error:
         st.error(str(error))
         st.stop()
@@ -291,37 +530,75 @@ def safe_load_worksheet_dataframe(
         st.error(str(error))
         st.stop()
     except Exception as error:
-        st.error(f"Unable to load '{worksheet_name}': {error}")
+        st.error(f"Unable to load {list(worksheet_names)}: {error}")
         st.stop()
 
 
+def refresh_cached_data() -> None:
+    """Drop cached frames and aggregates while keeping the authorized client alive."""
+
+    load_data.clear()
+    load_search_options.clear()
+    load_asset_lookup.clear()
+    load_tanker_options.clear()
+    fetch_spreadsheet_revision.clear()
+    load_worksheet_dataframes.clear()
+    shutil.rmtree(WORKSHEET_SNAPSHOT_DIR, ignore_errors=True)
+    compute_dispensing_metrics.clear()
+    compute_filter_options.clear()
+    compute_date_mask.clear()
+    compute_kpis.clear()
+    compute_asset_rankings.clear()
+    compute_data_quality_flags.clear()
+    compute_tanker_performance.clear()
+    compute_tanker_totals.clear()
+
+
 def normalize_headers(dataframe: pd.DataFrame) -> pd.DataFrame:
     if dataframe is None:
         return pd.DataFrame()
 
-    normalized = dataframe.copy()
-    normalized.columns = [str(column).strip() for column in normalized.columns]
-    return normalized
+    stripped_columns = [str(column).strip() for column in dataframe.columns]
+    if stripped_columns == list(dataframe.columns):
+        return dataframe
+
+    return dataframe.set_axis(stripped_columns, axis=1)
 
 
 def ensure_string_columns(dataframe: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
-    updated = dataframe.copy()
-    for column in columns:
-        if column in updated.columns:
-            updated[column] = updated[column].astype(str).str.strip()
-    return updated
+    return dataframe.assign(
+        **{
+            column: dataframe[column].astype(str).str.strip()
+            for column in columns
+            if column in dataframe.columns
+        }
+    )
+
+
+def parse_datetimes(values: pd.Series) -> pd.Series:
+    """Parse ISO strings quickly, falling back per value for sheet-formatted dates."""
+
+    parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    unparsed = parsed.isna() & values.notna() & (values.astype(str).str.strip() != "")
+    if unparsed.any():
+        parsed[unparsed] = pd.to_datetime(values[unparsed], errors="coerce", format="mixed")
+    return parsed
 
 
 def parse_event_datetime(dataframe: pd.DataFrame, timestamp_col="Timestamp", date_col="Date"):
+    """Parse the event columns of a freshly built frame in place and return it."""
+
     if dataframe.empty:
+        dataframe["Timestamp Text"] = ""
         dataframe["Event Datetime"] = pd.NaT
         return dataframe
 
-    parsed = dataframe.copy()
-    parsed[timestamp_col] = pd.to_datetime(parsed.get(timestamp_col), errors="coerce")
-    parsed[date_col] = pd.to_datetime(parsed.get(date_col), errors="coerce")
-    parsed["Event Datetime"] = parsed[timestamp_col].combine_first(parsed[date_col])
-    return parsed
+    # Keep the written text so local entries can be matched exactly, whatever it parses to.
+    dataframe["Timestamp Text"] = dataframe[timestamp_col].astype(str).str.strip()
+    dataframe[timestamp_col] = parse_datetimes(dataframe[timestamp_col])
+    dataframe[date_col] = parse_datetimes(dataframe[date_col])
+    dataframe["Event Datetime"] = dataframe[timestamp_col].combine_first(dataframe[date_col])
+    return dataframe
 
 
 def merge_assets_with_dispensing(dispensing_df: pd.DataFrame, assets_df: pd.DataFrame) -> pd.DataFrame:
@@ -331,38 +608,26 @@ def merge_assets_with_dispensing(dispensing_df: pd.DataFrame, assets_df: pd.Data
     dispensing_df = ensure_string_columns(dispensing_df, ["Fleet No", "Asset ID"])
     assets_df = ensure_string_columns(assets_df, ["Fleet No", "Asset ID"])
 
-    merged = dispensing_df.merge(
-        assets_df[
-            [
-                "Fleet No",
-                "Asset ID",
-                "Category",
-                "Description",
-                "Plate Number",
-                "Benchmark_KmL",
-            ]
-        ],
-        on="Fleet No",
-        how="left",
-        suffixes=("", "_asset"),
-    )
-
-    fallback_lookup = assets_df.set_index("Asset ID")
+    asset_columns = ["Asset ID", "Category", "Description", "Plate Number", "Benchmark_KmL"]
+    by_fleet = assets_df.drop_duplicates("Fleet No").set_index("Fleet No")[asset_columns]
+    by_asset = assets_df.drop_duplicates("Asset ID").set_index("Asset ID")[asset_columns[1:]]
 
-    for column in ["Asset ID", "Category", "Description", "Plate Number", "Benchmark_KmL"]:
-        asset_column = f"{column}_asset"
-        if asset_column in merged.columns:
-            merged[column] = merged[asset_column].combine_first(merged[column])
-            merged.drop(columns=[asset_column], inplace=True)
+    # Asset sheet values win over what was typed at dispense time; anything still
+    # missing is looked up by the resolved Asset ID.
+    resolved = by_fleet.reindex(dispensing_df["Fleet No"]).set_axis(dispensing_df.index)
+    resolved = resolved.combine_first(dispensing_df.reindex(columns=asset_columns))
+    resolved = resolved.combine_first(
+        by_asset.reindex(resolved["Asset ID"]).set_axis(resolved.index)
+    )
 
-        if column in fallback_lookup.columns:
-            merged[column] = merged[column].combine_first(
-                merged["Asset ID"].map(fallback_lookup[column])
-            )
+    merged = dispensing_df.assign(**{column: resolved[column] for column in asset_columns})
 
     merged["Asset Key"] = merged["Fleet No"].fillna("").replace("", pd.NA)
     merged["Asset Key"] = merged["Asset Key"].combine_first(merged["Asset ID"])
 
+    for column in MERGED_CATEGORY_COLUMNS:
+        merged[column] = merged[column].astype("category")
+
     return merged
 
 
@@ -370,88 +635,283 @@ def build_consumption_metrics(merged_df: pd.DataFrame) -> pd.DataFrame:
     if merged_df.empty:
         return pd.DataFrame()
 
-    analytics = merged_df.copy()
-    analytics = analytics.sort_values(["Asset Key", "Event Datetime"])
-    analytics["Previous Meter"] = analytics.groupby("Asset Key")["Current Meter"].shift(1)
-    analytics["Meter Delta"] = analytics["Current Meter"] - analytics["Previous Meter"]
+    analytics = merged_df.sort_values(["Asset Key", "Event Datetime"])
+
+    # After the sort each asset's readings are contiguous, so the previous meter is
+    # the row above unless that row belongs to another asset or has no key at all.
+    asset_codes = analytics["Asset Key"].astype("category").cat.codes.to_numpy()
+    meters = analytics["Current Meter"].to_numpy(dtype=float)
+    previous_meters = np.empty_like(meters)
+    previous_meters[0] = np.nan
+    previous_meters[1:] = meters[:-1]
+    starts_group = np.ones(len(asset_codes), dtype=bool)
+    starts_group[1:] = asset_codes[1:] != asset_codes[:-1]
+    previous_meters[starts_group | (asset_codes < 0)] = np.nan
+    meter_deltas = meters - previous_meters
+
+    analytics["Previous Meter"] = previous_meters
+    analytics["Meter Delta"] = meter_deltas
+
+    # Normalize each distinct unit once rather than every row.
+    meter_units = analytics["Meter Unit"].astype("category")
+    analytics["Meter Unit Normalized"] = meter_units.map(
+        {unit: str(unit).strip().lower() for unit in meter_units.cat.categories}
+    ).astype("category")
+
+    km_mask = (analytics["Meter Unit Normalized"] == "km").to_numpy()
+    hour_mask = analytics["Meter Unit Normalized"].isin(["hour", "hours"]).to_numpy()
+    fuel_out = analytics["Fuel Out (L)"].to_numpy(dtype=float)
+    benchmark = analytics["Benchmark_KmL"].to_numpy(dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        actual_km_per_l = np.where(km_mask, meter_deltas / fuel_out, np.nan)
+        efficiency_ratio = actual_km_per_l / benchmark
+        actual_l_per_hour = np.where(hour_mask, fuel_out / meter_deltas, np.nan)
+
+    for column, values in (
+        ("Actual Km/L", actual_km_per_l),
+        ("Efficiency Ratio", efficiency_ratio),
+        ("Actual L/hour", actual_l_per_hour),
+    ):
+        values[np.isinf(values)] = np.nan
+        analytics[column] = values
+
+    return analytics
 
-    analytics["Fuel Out (L)"] = pd.to_numeric(analytics["Fuel Out (L)"], errors="coerce")
-    analytics["Meter Delta"] = pd.to_numeric(analytics["Meter Delta"], errors="coerce")
-    analytics["Benchmark_KmL"] = pd.to_numeric(analytics.get("Benchmark_KmL"), errors="coerce")
 
-    analytics["Meter Unit Normalized"] = analytics["Meter Unit"].str.lower().str.strip()
+def sheet_data_version(dataframe: pd.DataFrame) -> tuple:
+    """Cheap fingerprint of a sheet: row count plus its last row.
 
-    km_mask = analytics["Meter Unit Normalized"] == "km"
-    hour_mask = analytics["Meter Unit Normalized"].isin(["hour", "hours"])
+    It cannot see in-place edits of earlier rows, so derived caches pair it with
+    the spreadsheet revision the frames were loaded at.
+    """
 
-    analytics.loc[km_mask, "Actual Km/L"] = analytics.loc[km_mask, "Meter Delta"] / analytics.loc[
-        km_mask, "Fuel Out (L)"
-    ]
-    analytics.loc[km_mask, "Efficiency Ratio"] = analytics.loc[km_mask, "Actual Km/L"] / analytics.loc[
-        km_mask, "Benchmark_KmL"
-    ]
+    if dataframe.empty:
+        return (0, ())
 
-    analytics.loc[hour_mask, "Actual L/hour"] = analytics.loc[hour_mask, "Fuel Out (L)"] / analytics.loc[
-        hour_mask, "Meter Delta"
-    ]
+    return (len(dataframe), tuple(dataframe.iloc[-1].astype(str)))
 
-    analytics.replace([np.inf, -np.inf], np.nan, inplace=True)
 
-    return analytics
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False, max_entries=4)
+def compute_dispensing_metrics(
+    data_version: tuple, _dispensing_df: pd.DataFrame, _assets_df: pd.DataFrame
+) -> pd.DataFrame:
+    """Merged dispensing rows with consumption metrics, rebuilt only when the sheets change."""
 
+    return build_consumption_metrics(merge_assets_with_dispensing(_dispensing_df, _assets_df))
 
-def build_data_quality_flags(analytics_df: pd.DataFrame, limits: dict) -> tuple[pd.DataFrame, dict]:
-    if analytics_df.empty:
-        return pd.DataFrame(), {}
 
-    issues = []
-    for _, row in analytics_df.iterrows():
-        reasons = []
-        unit = str(row.get("Meter Unit Normalized", "")).lower()
-        delta = row.get("Meter Delta")
-        fuel_out = row.get("Fuel Out (L)")
-        actual_km_per_l = row.get("Actual Km/L")
-        efficiency_ratio = row.get("Efficiency Ratio")
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False, max_entries=4)
+def compute_filter_options(
+    data_version: tuple, _merged_dispensing: pd.DataFrame
+) -> dict[str, list]:
+    """Sorted multiselect options per filter column, rebuilt only when the sheets change."""
+
+    return {
+        column: sorted(_merged_dispensing.get(column, pd.Series([])).dropna().unique())
+        for column in ("Category", "Fleet No", "Asset ID", "Source Tanker")
+    }
+
+
+def date_range_mask(datetimes: pd.Series, filter_start, filter_end) -> np.ndarray:
+    """Rows of ``datetimes`` on or between two calendar dates, compared as datetime64."""
+
+    values = datetimes.to_numpy(dtype="datetime64[ns]")
+    range_start = pd.Timestamp(filter_start).to_datetime64()
+    range_end = (pd.Timestamp(filter_end) + pd.Timedelta(days=1)).to_datetime64()
+    return (values >= range_start) & (values < range_end)
 
-        if pd.isna(delta) or delta <= 0:
-            reasons.append("Missing/invalid meter delta")
 
-        if pd.isna(fuel_out) or fuel_out <= 0:
-            reasons.append("Fuel Out (L) <= 0")
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False, max_entries=16)
+def compute_date_mask(
+    frame_key: tuple, filter_start, filter_end, _datetimes: pd.Series
+) -> np.ndarray:
+    """date_range_mask, keyed by frame and range so other widget changes reuse it."""
 
-        if unit not in {"km", "hour", "hours"}:
-            reasons.append("Meter Unit missing or not recognized")
+    return date_range_mask(_datetimes, filter_start, filter_end)
 
-        if unit == "km" and pd.notna(delta) and delta > limits["max_km_delta"]:
-            reasons.append("Extreme km delta")
 
-        if unit in {"hour", "hours"} and pd.notna(delta) and delta > limits["max_hour_delta"]:
-            reasons.append("Extreme hour delta")
+def rolling_efficiency(km_per_l: pd.Series, l_per_hour: pd.Series, window: int = 5) -> np.ndarray:
+    """Trailing NaN-skipping mean of Km/L, falling back to L/hour, over ``window`` rows."""
+
+    km_values = km_per_l.to_numpy(dtype=np.float64)
+    values = np.where(np.isnan(km_values), l_per_hour.to_numpy(dtype=np.float64), km_values)
+    present = ~np.isnan(values)
+    running_sum = np.cumsum(np.where(present, values, 0.0))
+    running_count = np.cumsum(present)
+    running_sum[window:] -= running_sum[:-window].copy()
+    running_count[window:] -= running_count[:-window].copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(running_count > 0, running_sum / running_count, np.nan)
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False, max_entries=32)
+def compute_kpis(cache_key: tuple, _dataframe: pd.DataFrame) -> tuple[float, int, int]:
+    return (
+        float(_dataframe["Fuel Out (L)"].sum()),
+        len(_dataframe),
+        int(_dataframe["Asset Key"].nunique()),
+    )
 
-        if pd.notna(fuel_out) and fuel_out > limits["max_fuel_out"]:
-            reasons.append("Fuel Out too large")
 
-        if unit == "km" and pd.notna(actual_km_per_l):
-            if actual_km_per_l < limits["min_km_per_l"] or actual_km_per_l > limits["max_km_per_l"]:
-                reasons.append("Efficiency outlier (Km/L)")
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False, max_entries=32)
+def compute_asset_rankings(
+    cache_key: tuple, _dataframe: pd.DataFrame, _km_mask: np.ndarray, _hour_mask: np.ndarray
+) -> tuple[pd.Series, pd.Series, pd.DataFrame, pd.DataFrame, pd.Series]:
+    """Consumption, frequency and efficiency leaders from per-asset bincounts.
+
+    ``Asset Key`` is categorical, so its codes index straight into ``np.bincount``;
+    only observed assets are kept, in category order, as ``groupby`` would.
+    """
+
+    asset_key = _dataframe["Asset Key"]
+    codes = asset_key.cat.codes.to_numpy()
+    valid = codes >= 0
+    codes = codes[valid]
+    n_assets = len(asset_key.cat.categories)
+
+    def per_asset_sum(values) -> np.ndarray:
+        return np.bincount(codes, weights=values[valid], minlength=n_assets)
+
+    fuel_out = _dataframe["Fuel Out (L)"]
+    fuel_values = fuel_out.to_numpy(dtype=np.float64, na_value=0.0)
+    fill_count = np.bincount(codes, minlength=n_assets)
+    km_rows = per_asset_sum(_km_mask.astype(np.float64))
+    hour_rows = per_asset_sum(_hour_mask.astype(np.float64))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        efficiency_ratio = (
+            per_asset_sum(
+                np.where(_km_mask, _dataframe["Efficiency Ratio"].to_numpy(dtype=np.float64), 0.0)
+            )
+            / km_rows
+        )
+        l_per_hour = (
+            per_asset_sum(
+                np.where(_hour_mask, _dataframe["Actual L/hour"].to_numpy(dtype=np.float64), 0.0)
+            )
+            / hour_rows
+        )
+
+    per_asset = pd.DataFrame(
+        {
+            "total_fuel": per_asset_sum(fuel_values),
+            "fill_count": fill_count,
+            "km_rows": km_rows,
+            "km_fuel": per_asset_sum(np.where(_km_mask, fuel_values, 0.0)),
+            "efficiency_ratio": efficiency_ratio,
+            "hour_rows": hour_rows,
+            "l_per_hour": l_per_hour,
+        },
+        index=pd.CategoricalIndex(
+            pd.Categorical.from_codes(np.arange(n_assets), dtype=asset_key.dtype),
+            name="Asset Key",
+        ),
+    )[fill_count > 0]
+    if pd.api.types.is_integer_dtype(fuel_out):
+        per_asset = per_asset.astype({"total_fuel": fuel_out.dtype, "km_fuel": fuel_out.dtype})
+
+    top_consumers = per_asset["total_fuel"].rename("Fuel Out (L)").nlargest(10)
+    freq_assets = per_asset["fill_count"].rename(None).nlargest(10)
+
+    ratio_summary = (
+        per_asset.loc[per_asset["km_rows"] > 0, ["km_fuel", "efficiency_ratio"]]
+        .rename(columns={"km_fuel": "Fuel Out (L)", "efficiency_ratio": "Efficiency Ratio"})
+        .reset_index()
+    )
+    top10 = ratio_summary.nlargest(10, "Efficiency Ratio")
+    bottom10 = ratio_summary.nsmallest(10, "Efficiency Ratio")
+    worst_hours = per_asset.loc[per_asset["hour_rows"] > 0, "l_per_hour"].rename("Actual L/hour")
+    worst_hours = worst_hours.nlargest(10)
+    return top_consumers, freq_assets, top10, bottom10, worst_hours
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False, max_entries=32)
+def compute_tanker_performance(cache_key: tuple, _dataframe: pd.DataFrame) -> pd.DataFrame:
+    tanker_group = _dataframe.groupby("Source Tanker", observed=True)
+    tanker_totals = tanker_group["Fuel Out (L)"].sum().sort_values(ascending=False)
+    return pd.DataFrame(
+        {
+            "Total Fuel Out": tanker_totals,
+            "Average per dispense": tanker_group["Fuel Out (L)"].mean(),
+        }
+    )
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False, max_entries=32)
+def compute_tanker_totals(
+    cache_key: tuple, _receipts_df: pd.DataFrame, _dispensing_df: pd.DataFrame
+) -> tuple[dict, dict]:
+    """Fuel in and out per tanker; callers get their own dicts, so they may add to them."""
+
+    return (
+        _receipts_df.groupby("Tanker No", observed=True)["Fuel In (L)"].sum().to_dict(),
+        _dispensing_df.groupby("Source Tanker", observed=True)["Fuel Out (L)"].sum().to_dict(),
+    )
 
-        if pd.notna(efficiency_ratio):
-            if (
-                efficiency_ratio < limits["min_efficiency_ratio"]
-                or efficiency_ratio > limits["max_efficiency_ratio"]
-            ):
-                reasons.append("Benchmark efficiency outlier")
 
-        if reasons:
-            issue_row = row.copy()
-            issue_row["Issues"] = "; ".join(reasons)
-            issues.append(issue_row)
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False, max_entries=32)
+def compute_data_quality_flags(
+    cache_key: tuple, limits: dict, _dataframe: pd.DataFrame
+) -> tuple[pd.DataFrame, int, dict]:
+    """Flagged-row count, per-issue counts and the capped table the page displays.
 
-    if not issues:
+    Only the displayed projection is cached, so a hit unpickles at most
+    ``ISSUE_DISPLAY_ROW_LIMIT`` rows instead of every flagged row.
+    """
+
+    issues_df, counts = build_data_quality_flags(_dataframe, limits)
+    if issues_df.empty:
+        return issues_df, 0, counts
+    issue_view = issues_df.head(ISSUE_DISPLAY_ROW_LIMIT).loc[:, ISSUE_DISPLAY_COLUMNS]
+    return issue_view, len(issues_df), counts
+
+
+def build_data_quality_flags(analytics_df: pd.DataFrame, limits: dict) -> tuple[pd.DataFrame, dict]:
+    if analytics_df.empty:
+        return pd.DataFrame(), {}
+
+    unit = analytics_df["Meter Unit Normalized"]
+    delta = analytics_df["Meter Delta"]
+    fuel_out = analytics_df["Fuel Out (L)"]
+    actual_km_per_l = analytics_df["Actual Km/L"]
+    efficiency_ratio = analytics_df["Efficiency Ratio"]
+
+    is_km = unit == "km"
+    is_hour = unit.isin(["hour", "hours"])
+
+    # NaN compares False, so the limit checks below skip missing values on their own.
+    flags = pd.DataFrame(
+        {
+            "Missing/invalid meter delta": delta.isna() | (delta <= 0),
+            "Fuel Out (L) <= 0": fuel_out.isna() | (fuel_out <= 0),
+            "Meter Unit missing or not recognized": ~(is_km | is_hour),
+            "Extreme km delta": is_km & (delta > limits["max_km_delta"]),
+            "Extreme hour delta": is_hour & (delta > limits["max_hour_delta"]),
+            "Fuel Out too large": fuel_out > limits["max_fuel_out"],
+            "Efficiency outlier (Km/L)": is_km
+            & (
+                (actual_km_per_l < limits["min_km_per_l"])
+                | (actual_km_per_l > limits["max_km_per_l"])
+            ),
+            "Benchmark efficiency outlier": (
+                (efficiency_ratio < limits["min_efficiency_ratio"])
+                | (efficiency_ratio > limits["max_efficiency_ratio"])
+            ),
+        }
+    )
+
+    has_issue = flags.any(axis=1)
+    if not has_issue.any():
         return pd.DataFrame(), {}
 
-    issues_df = pd.DataFrame(issues)
-    counts = issues_df["Issues"].str.get_dummies(sep="; ").sum().to_dict()
+    flags = flags[has_issue]
+    issue_text = pd.Series("", index=flags.index)
+    for reason in flags.columns:
+        issue_text = issue_text + np.where(flags[reason], f"{reason}; ", "")
+
+    issues_df = analytics_df[has_issue].assign(Issues=issue_text.str.rstrip("; "))
+    counts = {reason: int(count) for reason, count in flags.sum().items() if count}
     return issues_df, counts
 
 
@@ -465,8 +925,11 @@ def append_row_with_logging(
     logger.info("Appending to %s: %s", worksheet_label, row_values)
 
     try:
-        worksheet.append_row(row_values, value_input_option="USER_ENTERED")
-        last_row = worksheet.get_all_values()[-1]
+        # Echo the row from the append response instead of re-reading the sheet.
+        response = worksheet.append_row(
+            row_values, value_input_option="USER_ENTERED", include_values_in_response=True
+        )
+        last_row = response["updates"]["updatedData"]["values"][0]
     except Exception as error:
         st.error(f"Failed to append to {worksheet_label}: {error}")
         st.stop()
@@ -476,6 +939,141 @@ def append_row_with_logging(
     return last_row
 
 
+def queue_row(
+    worksheet_label: str, row_values: list, log_entry: dict, log_file: Path
+) -> int:
+    """Buffer a row and its local log entry for the next append; return the pending count."""
+
+    pending_rows = st.session_state.setdefault(PENDING_ROWS_KEYS[worksheet_label], [])
+    pending_rows.append({"row": row_values, "log_entry": log_entry, "log_file": log_file})
+    return len(pending_rows)
+
+
+def flush_pending_rows(
+    spreadsheet: gspread.Spreadsheet,
+    worksheet_label: str,
+    destination=st,
+) -> int:
+    """Write every buffered row for a worksheet with a single append_rows call.
+
+    Local CSV log entries are written only once the sheet has accepted the rows,
+    so entries recovered through a retry still reach the audit log.
+    """
+
+    pending_key = PENDING_ROWS_KEYS[worksheet_label]
+    pending_rows = st.session_state.get(pending_key, [])
+    if not pending_rows:
+        return 0
+
+    # Resolve the handle only when there is something to write.
+    worksheet = get_worksheet(spreadsheet, worksheet_label)
+    logger.info("Flushing %d rows to %s", len(pending_rows), worksheet_label)
+
+    try:
+        worksheet.append_rows(
+            [pending["row"] for pending in pending_rows], value_input_option="USER_ENTERED"
+        )
+    except Exception as error:
+        st.error(f"Failed to append to {worksheet_label}: {error}")
+        st.stop()
+
+    # Clear first so a log failure cannot resend rows the sheet already has.
+    st.session_state[pending_key] = []
+    for pending in pending_rows:
+        append_log(pending["log_entry"], pending["log_file"])
+    destination.success(f"Synced {len(pending_rows)} row(s) to {worksheet_label}.")
+    return len(pending_rows)
+
+
+def queue_row_and_flush(
+    spreadsheet: gspread.Spreadsheet,
+    worksheet_label: str,
+    row_values: list,
+    log_entry: dict,
+    log_file: Path,
+) -> int:
+    """Append a submitted row now, together with any rows left over from a failed sync."""
+
+    queue_row(worksheet_label, row_values, log_entry, log_file)
+    return flush_pending_rows(spreadsheet, worksheet_label)
+
+
+def render_pending_rows_panel(spreadsheet: gspread.Spreadsheet) -> None:
+    pending_counts = {
+        label: len(st.session_state.get(key, [])) for label, key in PENDING_ROWS_KEYS.items()
+    }
+    if not any(pending_counts.values()):
+        return
+
+    pending_panel = st.sidebar.container()
+    pending_panel.markdown("---")
+    pending_panel.subheader("Pending entries")
+    pending_panel.write(pending_counts)
+    pending_panel.caption("Entries whose sync failed are only kept for this browser session until retried.")
+
+    if pending_panel.button("Sync pending entries", type="primary"):
+        for label in PENDING_ROWS_KEYS:
+            flush_pending_rows(spreadsheet, label, destination=pending_panel)
+
+
+def record_local_tanker_entry(
+    worksheet_label: str,
+    entry_timestamp: datetime,
+    entry_date,
+    tanker: str,
+    fuel_in: float = 0.0,
+    fuel_out: float = 0.0,
+) -> None:
+    """Remember a submitted movement so balances reflect it before the next sheet read."""
+
+    st.session_state.setdefault(LOCAL_TANKER_ENTRIES_KEY, []).append(
+        {
+            "Worksheet": worksheet_label,
+            "Timestamp": entry_timestamp,
+            "Date": pd.Timestamp(entry_date),
+            "Tanker": tanker,
+            "Fuel In (L)": fuel_in,
+            "Fuel Out (L)": fuel_out,
+        }
+    )
+
+
+def unsynced_tanker_entries(loaded_frames: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Return local movements not yet in the loaded sheets, pruning the rest.
+
+    An entry is dropped once its row has left the pending buffer and its own
+    worksheet holds that exact Timestamp text. Entries without a match fall back to
+    the worksheet's newest parsed Timestamp, and are kept if it has none.
+    """
+
+    entries = st.session_state.get(LOCAL_TANKER_ENTRIES_KEY, [])
+    if not entries:
+        return pd.DataFrame(columns=LOCAL_TANKER_ENTRY_COLUMNS)
+
+    pending_timestamps = {
+        label: {pending["row"][0] for pending in st.session_state.get(key, [])}
+        for label, key in PENDING_ROWS_KEYS.items()
+    }
+    loaded_timestamps = {
+        label: set(frame["Timestamp Text"]) for label, frame in loaded_frames.items()
+    }
+    loaded_until = {label: frame["Timestamp"].max() for label, frame in loaded_frames.items()}
+
+    def is_unsynced(entry: dict) -> bool:
+        label = entry["Worksheet"]
+        entry_text = entry["Timestamp"].isoformat()
+        if entry_text in pending_timestamps[label]:
+            return True
+        if entry_text in loaded_timestamps[label]:
+            return False
+        newest = loaded_until[label]
+        return pd.isna(newest) or entry["Timestamp"] > newest
+
+    entries = [entry for entry in entries if is_unsynced(entry)]
+    st.session_state[LOCAL_TANKER_ENTRIES_KEY] = entries
+    return pd.DataFrame(entries, columns=LOCAL_TANKER_ENTRY_COLUMNS)
+
+
 def render_boot_diagnostics():
     """Display secrets visibility before any fail-fast checks."""
 
@@ -500,8 +1098,6 @@ def main():
 
     try:
         spreadsheet, sheet_url, service_account_json, secret_keys = require_google_sheet()
-        tanker_dispensing_sheet = get_worksheet(spreadsheet, "Tanker Dispensing")
-        tanker_receipts_sheet = get_worksheet(spreadsheet, "Tanker Receipts")
     except MissingSecretError as error:
         st.error(error)
         st.stop()
@@ -517,13 +1113,22 @@ def main():
         "Navigate", ["📝 Log Entry", "📊 Analytics Dashboard", "🛢️ Tanker Inventory"]
     )
 
+    if st.sidebar.button("🔄 Refresh data", type="secondary"):
+        refresh_cached_data()
+        st.rerun()
+
+    if "service_account_email" not in st.session_state:
+        st.session_state["service_account_email"] = json.loads(service_account_json).get(
+            "client_email"
+        )
+
     diagnostics_panel = st.sidebar.container()
     diagnostics_panel.markdown("---")
     diagnostics_panel.subheader("Diagnostics")
     diagnostics_panel.write({"st.secrets.keys()": secret_keys})
     diagnostics_panel.write(
         {
-            "client_email": json.loads(service_account_json).get("client_email"),
+            "client_email": st.session_state["service_account_email"],
             "sheet_url": sheet_url,
             "spreadsheet_title": spreadsheet.title,
             "spreadsheet_id": spreadsheet.id,
@@ -539,12 +1144,14 @@ def main():
             0.01,
         ]
         append_row_with_logging(
-            tanker_receipts_sheet,
+            get_worksheet(spreadsheet, "Tanker Receipts"),
             test_row,
             "Tanker Receipts",
             destination=diagnostics_panel,
         )
 
+    render_pending_rows_panel(spreadsheet)
+
     if page == "📝 Log Entry":
         st.title("New Fuel Transaction")
 
@@ -562,11 +1169,9 @@ def main():
             column_left, column_right = st.columns(2)
 
             with column_left:
-                searchable_db = build_search_labels(database)
-                search_options = [""] + list(searchable_db["Search_Label"].unique())
                 selected_label = st.selectbox(
                     "🔍 Search Fleet No (Type to Search):",
-                    options=search_options,
+                    options=load_search_options(DATABASE_FILE),
                 )
 
                 fleet_no = None
@@ -574,7 +1179,7 @@ def main():
                 asset_row = None
 
                 if selected_label:
-                    asset_row = searchable_db[searchable_db["Search_Label"] == selected_label].iloc[0]
+                    asset_row = load_asset_lookup(DATABASE_FILE)[selected_label]
 
                     st.success(f"**Selected:** {asset_row['Description']}")
 
@@ -585,23 +1190,27 @@ def main():
                     fleet_no = asset_row["Fleet No"]
                     category = asset_row["Category"]
 
-            with column_right:
-                tanker_options = get_tanker_options(database)
+            meter_unit = "Km"
+            if category and category in METER_HOUR_CATEGORIES:
+                meter_unit = "Hours"
+
+            # The fleet selectbox stays outside the form because it drives the
+            # details and meter unit; the remaining inputs rerun only on submit.
+            with column_right, st.form("dispense_form"):
+                tanker_options = load_tanker_options(DATABASE_FILE)
                 source_tanker = st.selectbox("⛽ Source Tanker (Dispenser):", options=tanker_options)
 
                 date = st.date_input("Date", datetime.today())
 
                 fuel_qty = st.number_input("Fuel Dispensed (Liters)", min_value=1.0, step=1.0)
 
-                meter_unit = "Km"
-                if category and category in METER_HOUR_CATEGORIES:
-                    meter_unit = "Hours"
-
                 current_meter = st.number_input(
                     f"Current Odometer/Hour Meter ({meter_unit})", min_value=0.0, step=1.0
                 )
 
-            if st.button("Submit Entry", type="primary"):
+                submitted = st.form_submit_button("Submit Entry", type="primary")
+
+            if submitted:
                 if not fleet_no or asset_row is None:
                     st.error("Please select a Fleet Number.")
                 else:
@@ -617,8 +1226,9 @@ def main():
                         "Meter Unit": meter_unit,
                     }
 
+                    entry_timestamp = datetime.utcnow()
                     dispensing_row = [
-                        datetime.utcnow().isoformat(),
+                        entry_timestamp.isoformat(),
                         date.isoformat(),
                         fleet_no,
                         asset_row["Asset ID"],
@@ -629,14 +1239,16 @@ def main():
                         current_meter,
                         meter_unit,
                     ]
-                    append_row_with_logging(
-                        tanker_dispensing_sheet, dispensing_row, "Tanker Dispensing"
+                    record_local_tanker_entry(
+                        "Tanker Dispensing", entry_timestamp, date, source_tanker, fuel_out=fuel_qty
+                    )
+                    queue_row_and_flush(
+                        spreadsheet,
+                        "Tanker Dispensing",
+                        dispensing_row,
+                        new_entry,
+                        VEHICLE_LOG_FILE,
                     )
-
-                    log_df = load_logs(VEHICLE_LOG_FILE, list(new_entry.keys()))
-                    new_df = pd.DataFrame([new_entry])
-                    log_df = pd.concat([log_df, new_df], ignore_index=True)
-                    save_log(log_df, VEHICLE_LOG_FILE)
 
                     st.toast(f"Logged {fuel_qty}L for {fleet_no}!")
                     st.success(
@@ -646,73 +1258,56 @@ def main():
         elif operation_type == "Refill Tanker (IN)":
             st.warning("Log fuel COMING IN to your Tankers from External Stations.")
 
-            column_left, column_right = st.columns(2)
-            with column_left:
-                tanker_options = get_tanker_options(database)
-                target_tanker = st.selectbox("Select Tanker Receiving Fuel:", options=tanker_options)
+            with st.form("refill_form"):
+                column_left, column_right = st.columns(2)
+                with column_left:
+                    tanker_options = load_tanker_options(DATABASE_FILE)
+                    target_tanker = st.selectbox(
+                        "Select Tanker Receiving Fuel:", options=tanker_options
+                    )
 
-            with column_right:
-                source_station = st.text_input("External Station Name (e.g., Shell Haima):")
+                with column_right:
+                    source_station = st.text_input("External Station Name (e.g., Shell Haima):")
 
-            vol_in = st.number_input("Volume Received (Liters):", min_value=1)
-            date_in = st.date_input("Date", datetime.today())
+                vol_in = st.number_input("Volume Received (Liters):", min_value=1)
+                date_in = st.date_input("Date", datetime.today())
 
-            if st.button("Log Refill"):
+                submitted = st.form_submit_button("Log Refill")
+
+            if submitted:
                 entry = {
                     "Date": date_in,
                     "Tanker No": target_tanker,
                     "Source Station": source_station,
                     "Fuel In (L)": vol_in,
                 }
+                entry_timestamp = datetime.utcnow()
                 receipt_row = [
-                    datetime.utcnow().isoformat(),
+                    entry_timestamp.isoformat(),
                     date_in.isoformat(),
                     target_tanker,
                     source_station,
                     vol_in,
                 ]
-                append_row_with_logging(
-                    tanker_receipts_sheet, receipt_row, "Tanker Receipts"
+                record_local_tanker_entry(
+                    "Tanker Receipts", entry_timestamp, date_in, target_tanker, fuel_in=vol_in
+                )
+                queue_row_and_flush(
+                    spreadsheet, "Tanker Receipts", receipt_row, entry, TANKER_LOG_FILE
                 )
-                log_df = load_logs(TANKER_LOG_FILE, list(entry.keys()))
-                new_df = pd.DataFrame([entry])
-                log_df = pd.concat([log_df, new_df], ignore_index=True)
-                save_log(log_df, TANKER_LOG_FILE)
 
                 st.success(f"✅ Added {vol_in}L to {target_tanker} Inventory.")
 
     elif page == "📊 Analytics Dashboard":
         st.title("Fuel Analytics")
 
-        if st.button("Refresh data", type="secondary"):
-            st.cache_data.clear()
-            st.cache_resource.clear()
-            st.rerun()
-
-        assets_df = safe_load_worksheet_dataframe(sheet_url, "Assets", service_account_json)
-        tanker_dispensing_df = safe_load_worksheet_dataframe(
-            sheet_url, "Tanker Dispensing", service_account_json
-        )
-        tanker_receipts_df = safe_load_worksheet_dataframe(
-            sheet_url, "Tanker Receipts", service_account_json
+        sheet_revision = current_sheet_revision(sheet_url, service_account_json)
+        worksheet_frames = safe_load_worksheet_dataframes(
+            sheet_url, service_account_json, revision=sheet_revision
         )
-
-        assets_df = normalize_headers(assets_df)
-        tanker_dispensing_df = normalize_headers(tanker_dispensing_df)
-        tanker_receipts_df = normalize_headers(tanker_receipts_df)
-
-        tanker_dispensing_df["Fuel Out (L)"] = pd.to_numeric(
-            tanker_dispensing_df["Fuel Out (L)"], errors="coerce"
-        )
-        tanker_receipts_df["Fuel In (L)"] = pd.to_numeric(
-            tanker_receipts_df["Fuel In (L)"], errors="coerce"
-        )
-        tanker_dispensing_df["Current Meter"] = pd.to_numeric(
-            tanker_dispensing_df["Current Meter"], errors="coerce"
-        )
-
-        tanker_dispensing_df = parse_event_datetime(tanker_dispensing_df)
-        tanker_receipts_df = parse_event_datetime(tanker_receipts_df)
+        assets_df = worksheet_frames["Assets"]
+        tanker_dispensing_df = worksheet_frames["Tanker Dispensing"]
+        tanker_receipts_df = worksheet_frames["Tanker Receipts"]
 
         event_dates = tanker_dispensing_df["Event Datetime"].dropna()
         if event_dates.empty:
@@ -726,8 +1321,16 @@ def main():
         default_start = max_date_ts - pd.Timedelta(days=DEFAULT_DATE_RANGE_DAYS - 1)
         default_start = max(default_start.date(), min_date)
 
-        merged_dispensing = merge_assets_with_dispensing(tanker_dispensing_df, assets_df)
-        merged_dispensing = build_consumption_metrics(merged_dispensing)
+        data_version = (
+            sheet_revision,
+            sheet_data_version(tanker_dispensing_df),
+            sheet_data_version(assets_df),
+        )
+        merged_dispensing = compute_dispensing_metrics(
+            data_version, tanker_dispensing_df, assets_df
+        )
+
+        filter_options = compute_filter_options(data_version, merged_dispensing)
 
         filter_container = st.container()
         with filter_container:
@@ -742,24 +1345,20 @@ def main():
                 )
                 selected_categories = st.multiselect(
                     "Category",
-                    options=sorted(
-                        pd.Series(merged_dispensing.get("Category", pd.Series([]))).dropna().unique()
-                    ),
+                    options=filter_options["Category"],
                 )
                 selected_fleet = st.multiselect(
                     "Fleet No",
-                    options=sorted(merged_dispensing.get("Fleet No", pd.Series([])).dropna().unique()),
+                    options=filter_options["Fleet No"],
                 )
                 selected_asset_ids = st.multiselect(
                     "Asset ID",
-                    options=sorted(merged_dispensing.get("Asset ID", pd.Series([])).dropna().unique()),
+                    options=filter_options["Asset ID"],
                 )
             with col2:
                 selected_tankers = st.multiselect(
                     "Source Tanker",
-                    options=sorted(
-                        merged_dispensing.get("Source Tanker", pd.Series([])).dropna().unique()
-                    ),
+                    options=filter_options["Source Tanker"],
                 )
                 meter_unit_filter = st.selectbox(
                     "Meter Unit",
@@ -770,46 +1369,60 @@ def main():
                     "Only show assets with Benchmark_KmL",
                     value=False,
                 )
-                st.caption("Refresh to reload Google Sheets data")
-
-        filtered_df = merged_dispensing[
-            merged_dispensing["Event Datetime"].dt.date.between(filter_start, filter_end)
-        ]
-
-        if selected_categories:
-            filtered_df = filtered_df[filtered_df["Category"].isin(selected_categories)]
-
-        if selected_fleet:
-            filtered_df = filtered_df[filtered_df["Fleet No"].isin(selected_fleet)]
-
-        if selected_asset_ids:
-            filtered_df = filtered_df[filtered_df["Asset ID"].isin(selected_asset_ids)]
-
-        if selected_tankers:
-            filtered_df = filtered_df[filtered_df["Source Tanker"].isin(selected_tankers)]
+                st.caption("Use 🔄 Refresh data in the sidebar to reload Google Sheets data")
+
+        # Build one mask and index once instead of slicing after every filter.
+        filter_mask = compute_date_mask(
+            ("Analytics", *data_version),
+            filter_start,
+            filter_end,
+            merged_dispensing["Event Datetime"],
+        )
 
-        if meter_unit_filter != "All":
-            if meter_unit_filter == "km":
-                filtered_df = filtered_df[filtered_df["Meter Unit Normalized"] == "km"]
-            else:
-                filtered_df = filtered_df[
-                    filtered_df["Meter Unit Normalized"].isin(["hour", "hours"])
-                ]
+        for column, selected_values in (
+            ("Category", selected_categories),
+            ("Fleet No", selected_fleet),
+            ("Asset ID", selected_asset_ids),
+            ("Source Tanker", selected_tankers),
+        ):
+            if selected_values:
+                filter_mask &= merged_dispensing[column].isin(selected_values).to_numpy()
+
+        if meter_unit_filter == "km":
+            filter_mask &= (merged_dispensing["Meter Unit Normalized"] == "km").to_numpy()
+        elif meter_unit_filter == "hour":
+            filter_mask &= (
+                merged_dispensing["Meter Unit Normalized"].isin(["hour", "hours"]).to_numpy()
+            )
 
         if only_with_benchmark:
-            filtered_df = filtered_df[
-                filtered_df["Benchmark_KmL"].notna()
-                & (pd.to_numeric(filtered_df["Benchmark_KmL"], errors="coerce") > 0)
-            ]
+            filter_mask &= (merged_dispensing["Benchmark_KmL"] > 0).to_numpy()
+
+        filtered_df = merged_dispensing[filter_mask]
 
         if filtered_df.empty:
             st.error("No dispensing data found for the selected filters.")
             st.stop()
 
+        analytics_cache_key = (
+            *data_version,
+            filter_start,
+            filter_end,
+            tuple(selected_categories),
+            tuple(selected_fleet),
+            tuple(selected_asset_ids),
+            tuple(selected_tankers),
+            meter_unit_filter,
+            only_with_benchmark,
+        )
+        total_fuel, total_transactions, active_assets = compute_kpis(
+            analytics_cache_key, filtered_df
+        )
+
         kpi1, kpi2, kpi3 = st.columns(3)
-        kpi1.metric("Total Fuel Consumed", f"{filtered_df['Fuel Out (L)'].sum():,.0f} L")
-        kpi2.metric("Total Transactions", len(filtered_df))
-        kpi3.metric("Active Assets", filtered_df["Asset Key"].nunique())
+        kpi1.metric("Total Fuel Consumed", f"{total_fuel:,.0f} L")
+        kpi2.metric("Total Transactions", total_transactions)
+        kpi3.metric("Active Assets", active_assets)
 
         limits_container = st.expander("Data quality limits", expanded=False)
         with limits_container:
@@ -859,61 +1472,55 @@ def main():
             "max_efficiency_ratio": max_eff_ratio,
         }
 
-        issues_df, issue_counts = build_data_quality_flags(filtered_df, limits)
+        issue_view, issue_total, issue_counts = compute_data_quality_flags(
+            analytics_cache_key, limits, filtered_df
+        )
 
         st.markdown("---")
         st.subheader("Data Quality")
         col_issue_a, col_issue_b = st.columns([1, 2])
         with col_issue_a:
-            st.metric("Rows with issues", len(issues_df))
+            st.metric("Rows with issues", issue_total)
             if issue_counts:
                 st.write(issue_counts)
         with col_issue_b:
-            if issues_df.empty:
+            if issue_total == 0:
                 st.success("No data quality issues detected for the current filters.")
             else:
-                st.dataframe(issues_df[[
-                    "Event Datetime",
-                    "Fleet No",
-                    "Asset ID",
-                    "Source Tanker",
-                    "Fuel Out (L)",
-                    "Current Meter",
-                    "Previous Meter",
-                    "Meter Delta",
-                    "Actual Km/L",
-                    "Actual L/hour",
-                    "Efficiency Ratio",
-                    "Issues",
-                ]], use_container_width=True)
+                st.dataframe(issue_view, use_container_width=True)
+                if issue_total > ISSUE_DISPLAY_ROW_LIMIT:
+                    st.caption(
+                        f"Showing the first {ISSUE_DISPLAY_ROW_LIMIT} of {issue_total} flagged rows."
+                    )
 
         st.markdown("---")
         st.subheader("Asset Performance")
         perf_col_a, perf_col_b = st.columns(2)
 
-        km_rows = filtered_df[
-            (filtered_df["Meter Unit Normalized"] == "km")
-            & filtered_df["Actual Km/L"].notna()
-            & filtered_df["Benchmark_KmL"].notna()
-            & filtered_df["Efficiency Ratio"].notna()
-        ]
-        hour_rows = filtered_df[
-            filtered_df["Meter Unit Normalized"].isin(["hour", "hours"])
-            & filtered_df["Actual L/hour"].notna()
-        ]
+        meter_units = filtered_df["Meter Unit Normalized"]
+        km_mask = np.logical_and.reduce(
+            [
+                (meter_units == "km").to_numpy(),
+                ~np.isnan(filtered_df["Actual Km/L"].to_numpy(dtype=np.float64)),
+                ~np.isnan(filtered_df["Benchmark_KmL"].to_numpy(dtype=np.float64)),
+                ~np.isnan(filtered_df["Efficiency Ratio"].to_numpy(dtype=np.float64)),
+            ]
+        )
+        hour_mask = meter_units.isin(["hour", "hours"]).to_numpy() & ~np.isnan(
+            filtered_df["Actual L/hour"].to_numpy(dtype=np.float64)
+        )
+        km_row_count = int(km_mask.sum())
+        hour_row_count = int(hour_mask.sum())
+
+        top_consumers, freq_assets, top10, bottom10, worst_hours = compute_asset_rankings(
+            analytics_cache_key, filtered_df, km_mask, hour_mask
+        )
 
         with perf_col_a:
             st.caption("Top/Bottom by efficiency ratio (Km/L vs Benchmark)")
-            if km_rows.empty:
+            if km_row_count == 0:
                 st.info("No benchmark data available for selected filters.")
             else:
-                ratio_summary = (
-                    km_rows.groupby("Asset Key")[["Fuel Out (L)", "Efficiency Ratio"]]
-                    .agg({"Fuel Out (L)": "sum", "Efficiency Ratio": "mean"})
-                    .reset_index()
-                )
-                top10 = ratio_summary.sort_values("Efficiency Ratio", ascending=False).head(10)
-                bottom10 = ratio_summary.sort_values("Efficiency Ratio", ascending=True).head(10)
                 st.write("Top 10 Assets by Efficiency Ratio")
                 st.dataframe(top10, use_container_width=True)
                 st.write("Bottom 10 Assets by Efficiency Ratio")
@@ -921,61 +1528,50 @@ def main():
 
         with perf_col_b:
             st.caption("Hour-meter efficiency and fuel volume leaders")
-            if hour_rows.empty:
+            if hour_row_count == 0:
                 st.info("No hour-based efficiency data available for selected filters.")
             else:
-                worst_hours = (
-                    hour_rows.groupby("Asset Key")["Actual L/hour"].mean().sort_values(ascending=False)
-                )
                 st.write("Worst 10 Assets by Actual L/hour")
-                st.dataframe(worst_hours.head(10), use_container_width=True)
+                st.dataframe(worst_hours, use_container_width=True)
 
         consumer_col1, consumer_col2 = st.columns(2)
         with consumer_col1:
             st.caption("Highest fuel consumers")
-            top_consumers = (
-                filtered_df.groupby("Asset Key")["Fuel Out (L)"].sum().sort_values(ascending=False)
-            )
-            st.bar_chart(top_consumers.head(10))
+            st.bar_chart(top_consumers)
         with consumer_col2:
             st.caption("Most frequent fueling assets")
-            freq_assets = filtered_df.groupby("Asset Key").size().sort_values(ascending=False)
-            st.bar_chart(freq_assets.head(10))
+            st.bar_chart(freq_assets)
 
-        unique_assets = filtered_df["Asset Key"].dropna().unique()
-        if len(unique_assets) == 1:
+        if active_assets == 1:
             st.markdown("---")
             st.subheader("Asset Trend")
-            asset_df = filtered_df.sort_values("Event Datetime")
-            asset_df["Rolling Efficiency"] = (
-                asset_df["Actual Km/L"].fillna(asset_df["Actual L/hour"])
-            ).rolling(5, min_periods=1).mean()
+            asset_df = filtered_df
+            if not asset_df["Event Datetime"].is_monotonic_increasing:
+                asset_df = asset_df.sort_values("Event Datetime", kind="mergesort")
+            asset_trend = asset_df.set_index("Event Datetime")
+            efficiency_trend = asset_trend[["Actual Km/L", "Actual L/hour"]].assign(
+                **{
+                    "Rolling Efficiency": rolling_efficiency(
+                        asset_trend["Actual Km/L"], asset_trend["Actual L/hour"]
+                    )
+                }
+            )
 
             trend_cols = st.columns(3)
             with trend_cols[0]:
-                st.line_chart(asset_df.set_index("Event Datetime")["Fuel Out (L)"])
+                st.line_chart(asset_trend["Fuel Out (L)"])
             with trend_cols[1]:
-                st.line_chart(asset_df.set_index("Event Datetime")["Meter Delta"])
+                st.line_chart(asset_trend["Meter Delta"])
             with trend_cols[2]:
-                st.line_chart(asset_df.set_index("Event Datetime")[["Actual Km/L", "Actual L/hour", "Rolling Efficiency"]])
+                st.line_chart(efficiency_trend)
         else:
             st.info("Select exactly one Fleet No or Asset ID to view detailed trend charts.")
 
         st.markdown("---")
         st.subheader("Tanker Performance (dispensing)")
-        tanker_group = filtered_df.groupby("Source Tanker")
-        tanker_totals = tanker_group["Fuel Out (L)"].sum().sort_values(ascending=False)
-        tanker_avg = tanker_group["Fuel Out (L)"].mean()
-        st.bar_chart(tanker_totals)
-        st.dataframe(
-            pd.DataFrame(
-                {
-                    "Total Fuel Out": tanker_totals,
-                    "Average per dispense": tanker_avg,
-                }
-            ),
-            use_container_width=True,
-        )
+        tanker_performance = compute_tanker_performance(analytics_cache_key, filtered_df)
+        st.bar_chart(tanker_performance["Total Fuel Out"])
+        st.dataframe(tanker_performance, use_container_width=True)
 
         with st.expander("Debug data summary", expanded=False):
             st.write(
@@ -988,13 +1584,13 @@ def main():
                         "Filtered": len(filtered_df),
                     },
                     "date_bounds": {
-                        "dispensing_min": event_dates.min(),
-                        "dispensing_max": event_dates.max(),
+                        "dispensing_min": min_date_ts,
+                        "dispensing_max": max_date_ts,
                     },
                     "metric_counts": {
-                        "km_rows": len(km_rows),
-                        "hour_rows": len(hour_rows),
-                        "quality_issues": len(issues_df),
+                        "km_rows": km_row_count,
+                        "hour_rows": hour_row_count,
+                        "quality_issues": issue_total,
                     },
                     "current_filter_range": {
                         "start": filter_start,
@@ -1007,41 +1603,38 @@ def main():
         st.title("Tanker Balances")
         st.write("Live tracking of fuel inside your 4 mobile tankers.")
 
-        if st.button("🔄 Refresh data", type="secondary"):
-            st.cache_data.clear()
-            st.cache_resource.clear()
-            st.rerun()
-
-        tanker_dispensing_df = safe_load_worksheet_dataframe(
-            sheet_url, "Tanker Dispensing", service_account_json
+        sheet_revision = current_sheet_revision(sheet_url, service_account_json)
+        worksheet_frames = safe_load_worksheet_dataframes(
+            sheet_url, service_account_json, revision=sheet_revision
         )
-        tanker_receipts_df = safe_load_worksheet_dataframe(
-            sheet_url, "Tanker Receipts", service_account_json
+        tanker_dispensing_df = worksheet_frames["Tanker Dispensing"]
+        tanker_receipts_df = worksheet_frames["Tanker Receipts"]
+
+        dispensing_dates = tanker_dispensing_df["Date"]
+        receipt_dates = tanker_receipts_df["Date"]
+        dispensing_min, dispensing_max = dispensing_dates.min(), dispensing_dates.max()
+        receipts_min, receipts_max = receipt_dates.min(), receipt_dates.max()
+
+        # Prune against each worksheet's own rows so a receipts read cannot drop
+        # dispensing entries that have not come back yet.
+        local_entries = unsynced_tanker_entries(
+            {
+                "Tanker Dispensing": tanker_dispensing_df,
+                "Tanker Receipts": tanker_receipts_df,
+            }
         )
 
-        tanker_dispensing_df["Date"] = pd.to_datetime(
-            tanker_dispensing_df["Date"], errors="coerce"
-        )
-        tanker_receipts_df["Date"] = pd.to_datetime(
-            tanker_receipts_df["Date"], errors="coerce"
-        )
-        tanker_dispensing_df["Fuel Out (L)"] = pd.to_numeric(
-            tanker_dispensing_df["Fuel Out (L)"], errors="coerce"
-        )
-        tanker_receipts_df["Fuel In (L)"] = pd.to_numeric(
-            tanker_receipts_df["Fuel In (L)"], errors="coerce"
-        )
-
-        dispensing_dates = tanker_dispensing_df["Date"].dropna()
-        receipt_dates = tanker_receipts_df["Date"].dropna()
-        combined_dates = pd.concat([dispensing_dates, receipt_dates])
+        date_bounds = [dispensing_min, dispensing_max, receipts_min, receipts_max]
+        if not local_entries.empty:
+            date_bounds.extend((local_entries["Date"].min(), local_entries["Date"].max()))
+        date_bounds = [bound for bound in date_bounds if pd.notna(bound)]
 
-        if combined_dates.empty:
+        if not date_bounds:
             st.error("No valid dates found in Google Sheets. Please verify data entries.")
             st.stop()
 
-        min_date = combined_dates.min().date()
-        max_date = combined_dates.max().date()
+        min_date = min(date_bounds).date()
+        max_date = max(date_bounds).date()
 
         filter_start, filter_end = st.date_input(
             "Filter date range",
@@ -1050,37 +1643,68 @@ def main():
             max_value=max_date,
         )
 
-        filtered_dispensing = tanker_dispensing_df[
-            tanker_dispensing_df["Date"].dt.date.between(filter_start, filter_end)
-        ]
-        filtered_receipts = tanker_receipts_df[
-            tanker_receipts_df["Date"].dt.date.between(filter_start, filter_end)
-        ]
+        dispensing_version = (sheet_revision, sheet_data_version(tanker_dispensing_df))
+        receipts_version = (sheet_revision, sheet_data_version(tanker_receipts_df))
+        dispensing_in_range = compute_date_mask(
+            ("Tanker Dispensing", dispensing_version),
+            filter_start,
+            filter_end,
+            dispensing_dates,
+        )
+        receipts_in_range = compute_date_mask(
+            ("Tanker Receipts", receipts_version),
+            filter_start,
+            filter_end,
+            receipt_dates,
+        )
+        filtered_dispensing = tanker_dispensing_df[dispensing_in_range]
+        filtered_receipts = tanker_receipts_df[receipts_in_range]
+        if not local_entries.empty:
+            local_entries = local_entries[
+                date_range_mask(local_entries["Date"], filter_start, filter_end)
+            ]
 
-        if filtered_dispensing.empty and filtered_receipts.empty:
+        if filtered_dispensing.empty and filtered_receipts.empty and local_entries.empty:
             st.error("No tanker activity found for the selected date range.")
             st.stop()
 
         column_grid = st.columns(2)
 
-        for index, tanker in enumerate(DEFAULT_TANKERS):
-            total_in = filtered_receipts[
-                filtered_receipts["Tanker No"] == tanker
-            ]["Fuel In (L)"].sum()
-            total_out = filtered_dispensing[
-                filtered_dispensing["Source Tanker"] == tanker
-            ]["Fuel Out (L)"].sum()
+        fuel_in_by_tanker, fuel_out_by_tanker = compute_tanker_totals(
+            (dispensing_version, receipts_version, filter_start, filter_end),
+            filtered_receipts,
+            filtered_dispensing,
+        )
 
-            current_balance = total_in - total_out
+        if not local_entries.empty:
+            st.caption(
+                f"Includes {len(local_entries)} entries logged this session that are not in "
+                "the loaded sheet data yet."
+            )
+            local_totals = local_entries.groupby("Tanker")[["Fuel In (L)", "Fuel Out (L)"]].sum()
+            for tanker, totals in local_totals.iterrows():
+                fuel_in_by_tanker[tanker] = fuel_in_by_tanker.get(tanker, 0.0) + totals["Fuel In (L)"]
+                fuel_out_by_tanker[tanker] = (
+                    fuel_out_by_tanker.get(tanker, 0.0) + totals["Fuel Out (L)"]
+                )
+
+        tanker_totals = [
+            (fuel_in_by_tanker.get(tanker, 0.0), fuel_out_by_tanker.get(tanker, 0.0))
+            for tanker in DEFAULT_TANKERS
+        ]
+        tanker_balances = [total_in - total_out for total_in, total_out in tanker_totals]
+        fill_fractions = np.clip(
+            np.asarray(tanker_balances, dtype=float) / TANKER_CAPACITY_L, 0.0, 1.0
+        )
+
+        for index, tanker in enumerate(DEFAULT_TANKERS):
+            total_in, total_out = tanker_totals[index]
 
             with column_grid[index % 2]:
                 st.container(border=True)
                 st.subheader(f"🚛 {tanker}")
-                st.metric("Current Level", f"{current_balance:,.0f} L")
-
-                capacity = 30000
-                percent = max(0.0, min(1.0, current_balance / capacity))
-                st.progress(percent)
+                st.metric("Current Level", f"{tanker_balances[index]:,.0f} L")
+                st.progress(float(fill_fractions[index]))
                 st.caption(f"IN: {total_in} L | OUT: {total_out} L")
 
         with st.expander("Debug data summary", expanded=False):
@@ -1091,10 +1715,10 @@ def main():
                         "Tanker Receipts": len(tanker_receipts_df),
                     },
                     "date_bounds": {
-                        "dispensing_min": dispensing_dates.min(),
-                        "dispensing_max": dispensing_dates.max(),
-                        "receipts_min": receipt_dates.min(),
-                        "receipts_max": receipt_dates.max(),
+                        "dispensing_min": dispensing_min,
+                        "dispensing_max": dispensing_max,
+                        "receipts_min": receipts_min,
+                        "receipts_max": receipts_max,
                     },
                     "current_filter_range": {
                         "start": filter_start,